@@ -3,26 +3,192 @@
 from __future__ import print_function
 
 import argparse
+import mmap
 import os
 import posixpath
+import re
+import stat
 import sys
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 
-import xml.etree.ElementTree as ElementTree
-from typing import BinaryIO, Sequence, Iterator, Tuple
+from typing import BinaryIO, Dict, List, Optional, Sequence, Iterator, Tuple
 
 if sys.version_info < (3,):
     from urllib import quote, unquote
 else:
     from urllib.parse import quote, unquote
 
+if sys.version_info < (3,):
+    from Queue import Empty, Queue
+else:
+    from queue import Empty, Queue
+
+if sys.version_info < (3, 5):
+    from scandir import scandir
+else:
+    from os import scandir
+
+if sys.version_info < (3, 2):
+    # No memoization on Python 2, call the function directly
+    def lru_cache(maxsize=128):
+        def decorator(function):
+            return function
+
+        return decorator
+else:
+    from functools import lru_cache
+
 import requests
-from cowlist import COWList
+from requests.adapters import HTTPAdapter
 from fspathverbs import Root, Parent, Current, Child, compile_to_fspathverbs
 
+try:
+    from lxml import etree
+except ImportError:
+    # Fall back to the slower parser in the standard library
+    etree = None
+    import xml.etree.ElementTree as ElementTree
+
+DAV_NAMESPACES = {'d': 'DAV:'}
+
+DAV_RESPONSE_TAG = '{DAV:}response'
+
+# Only ask for the property needed to tell files from directories, instead of all properties
+PROPFIND_RESOURCETYPE_BODY = (
+    b'<?xml version="1.0" encoding="utf-8"?>'
+    b'<d:propfind xmlns:d="DAV:"><d:prop><d:resourcetype/></d:prop></d:propfind>'
+)
+
+# Path components consisting only of unreserved characters need no percent-encoding
+UNRESERVED_REMOTE_PATH_COMPONENT_RE = re.compile(r'\A[A-Za-z0-9._~-]+\Z')
+
+# Maximum number of memoized hrefs per client
+HREF_CACHE_SIZE = 4096
+
+# Maximum number of distinct interned path components
+INTERNED_PATH_COMPONENTS_SIZE = 65536
+
+# Maximum number of pooled keep-alive connections to the server
+# Leaves headroom over the default number of workers for concurrent operations issued by callers
+CONNECTION_POOL_SIZE = 32
+
+# Size of the chunks in which file bodies are transferred
+CHUNK_SIZE = 1 << 20
+
+# Smallest upload memory-mapped instead of read in chunks
+MEMORY_MAP_MIN_SIZE = 8 << 20
+
+# Largest download read into a buffer of exactly its Content-Length and written at once
+SIZED_DOWNLOAD_MAX_SIZE = 2 << 20
+
+
+if etree is not None:
+    # Compiled once, evaluated per PROPFIND response
+    DAV_RESPONSE_HREF_XPATH = etree.XPath('string(d:href)', namespaces=DAV_NAMESPACES)
+    # A collection is marked by a DAV:collection element within the DAV:resourcetype property (RFC 4918, section 14.3)
+    DAV_RESPONSE_IS_COLLECTION_XPATH = etree.XPath(
+        'boolean(d:propstat/d:prop/d:resourcetype/d:collection)',
+        namespaces=DAV_NAMESPACES
+    )
+    DAV_RESPONSE_STATUS_XPATH = etree.XPath('string(d:status)', namespaces=DAV_NAMESPACES)
+
+
+    def iterate_hrefs_is_collections_and_statuses(
+            multistatus_file,  # type: BinaryIO
+    ):
+        # type: (...) -> Iterator[Tuple[Optional[str], bool, str]]
+        """
+        Incrementally parse a DAV:multistatus document as it is read,
+        yielding (href, is_collection, status) for each DAV:response
+        and keeping only one DAV:response in memory at a time.
+
+        Args:
+            multistatus_file (BinaryIO): File-like object over the DAV:multistatus document.
+
+        Yields:
+            Tuple[Optional[str], bool, str]: (href, is_collection, status) for each DAV:response,
+                where status is the DAV:response's own DAV:status, or '' if it has none.
+        """
+        # Never expand entities or fetch DTDs a server sends, which older lxml versions do by default
+        for _, dav_response_node in etree.iterparse(
+                multistatus_file,
+                events=('end',),
+                tag=DAV_RESPONSE_TAG,
+                resolve_entities=False,
+                no_network=True,
+                load_dtd=False,
+        ):
+            dav_response_dav_href = DAV_RESPONSE_HREF_XPATH(dav_response_node)
+            is_collection = DAV_RESPONSE_IS_COLLECTION_XPATH(dav_response_node)
+            dav_response_dav_status = DAV_RESPONSE_STATUS_XPATH(dav_response_node)
+
+            # Drop the processed node and its already-processed siblings
+            dav_response_node.clear()
+            while dav_response_node.getprevious() is not None:
+                del dav_response_node.getparent()[0]
+
+            yield dav_response_dav_href, is_collection, dav_response_dav_status
+else:
+    DAV_RESPONSE_HREF_PATH = '{DAV:}href'
+    # A collection is marked by a DAV:collection element within the DAV:resourcetype property (RFC 4918, section 14.3)
+    DAV_RESPONSE_COLLECTION_PATH = '{DAV:}propstat/{DAV:}prop/{DAV:}resourcetype/{DAV:}collection'
+    DAV_RESPONSE_STATUS_PATH = '{DAV:}status'
+
+
+    def iterate_hrefs_is_collections_and_statuses(
+            multistatus_file,  # type: BinaryIO
+    ):
+        # type: (...) -> Iterator[Tuple[Optional[str], bool, str]]
+        """
+        Incrementally parse a DAV:multistatus document as it is read,
+        yielding (href, is_collection, status) for each DAV:response
+        and keeping only one DAV:response in memory at a time.
+
+        Args:
+            multistatus_file (BinaryIO): File-like object over the DAV:multistatus document.
+
+        Yields:
+            Tuple[Optional[str], bool, str]: (href, is_collection, status) for each DAV:response,
+                where status is the DAV:response's own DAV:status, or '' if it has none.
+        """
+        dav_multistatus_node = None
+        for event, node in ElementTree.iterparse(multistatus_file, events=('start', 'end')):
+            if dav_multistatus_node is None:
+                dav_multistatus_node = node
+            elif event == 'end' and node.tag == DAV_RESPONSE_TAG:
+                dav_response_dav_href = node.findtext(DAV_RESPONSE_HREF_PATH)
+                is_collection = node.find(DAV_RESPONSE_COLLECTION_PATH) is not None
+                dav_response_dav_status = node.findtext(DAV_RESPONSE_STATUS_PATH, '')
+
+                # Drop the processed node and its already-processed siblings
+                dav_multistatus_node.clear()
+
+                yield dav_response_dav_href, is_collection, dav_response_dav_status
+
+
+def is_successful_dav_status(
+        dav_status,  # type: str
+):
+    # type: (...) -> bool
+    """
+    Tell whether the DAV:status of a DAV:response (e.g. 'HTTP/1.1 200 OK') reports success.
+
+    Args:
+        dav_status (str): The DAV:status, or '' if the DAV:response has none,
+            in which case its DAV:propstat elements carry the statuses of its properties instead.
+
+    Returns:
+        bool: True if there is no DAV:status or it has a 2xx status code, False otherwise.
+    """
+    if not dav_status:
+        return True
+    status_line_parts = dav_status.split()
+    return len(status_line_parts) >= 2 and status_line_parts[1].startswith('2')
+
 
 class ListResult(object):
     """Base class for results of listing a remote path."""
-    pass
+    __slots__ = ()
 
 
 class IsDirectory(ListResult):
@@ -33,6 +199,7 @@ class IsDirectory(ListResult):
         containing_file_path_components (Sequence[Sequence[str]]): Path components of files in directory.
         containing_directory_path_components (Sequence[Sequence[str]]): Path components of subdirectories.
     """
+    __slots__ = ('containing_file_path_components', 'containing_directory_path_components')
 
     def __init__(
             self,
@@ -53,10 +220,14 @@ class IsDirectory(ListResult):
         return self.__class__, (self.containing_file_path_components, self.containing_directory_path_components)
 
     def __hash__(self):
-        return hash(self.__reduce__())
+        return hash((self.__class__, self.containing_file_path_components, self.containing_directory_path_components))
 
     def __eq__(self, other):
-        return self.__reduce__() == other.__reduce__()
+        return (
+                self.__class__ is other.__class__
+                and self.containing_file_path_components == other.containing_file_path_components
+                and self.containing_directory_path_components == other.containing_directory_path_components
+        )
 
 
 class IsFile(ListResult):
@@ -66,6 +237,7 @@ class IsFile(ListResult):
     Args:
         file_path_components (Sequence[str]): Path components of the file.
     """
+    __slots__ = ('file_path_components',)
 
     def __init__(
             self,
@@ -80,14 +252,18 @@ class IsFile(ListResult):
         return self.__class__, (self.file_path_components,)
 
     def __hash__(self):
-        return hash(self.__reduce__())
+        return hash((self.__class__, self.file_path_components))
 
     def __eq__(self, other):
-        return self.__reduce__() == other.__reduce__()
+        return (
+                self.__class__ is other.__class__
+                and self.file_path_components == other.file_path_components
+        )
 
 
 class NotFound(ListResult):
     """Indicates the remote path was not found."""
+    __slots__ = ()
 
     def __repr__(self):
         return '%s()' % (self.__class__.__name__,)
@@ -96,15 +272,15 @@ class NotFound(ListResult):
         return self.__class__, ()
 
     def __hash__(self):
-        return hash(self.__reduce__())
+        return hash(self.__class__)
 
     def __eq__(self, other):
-        return self.__reduce__() == other.__reduce__()
+        return self.__class__ is other.__class__
 
 
 class GetAction(object):
     """Base class for actions required in get (download) operations."""
-    pass
+    __slots__ = ()
 
 
 class DownloadRemoteFile(GetAction):
@@ -115,6 +291,7 @@ class DownloadRemoteFile(GetAction):
         remote_file_path_components (Sequence[str]): Remote file path components.
         relative_local_file_path_components (Sequence[str]): Relative local file path components to save file as.
     """
+    __slots__ = ('remote_file_path_components', 'relative_local_file_path_components')
 
     def __init__(
             self,
@@ -135,10 +312,14 @@ class DownloadRemoteFile(GetAction):
         return self.__class__, (self.remote_file_path_components, self.relative_local_file_path_components)
 
     def __hash__(self):
-        return hash(self.__reduce__())
+        return hash((self.__class__, self.remote_file_path_components, self.relative_local_file_path_components))
 
     def __eq__(self, other):
-        return self.__reduce__() == other.__reduce__()
+        return (
+                self.__class__ is other.__class__
+                and self.remote_file_path_components == other.remote_file_path_components
+                and self.relative_local_file_path_components == other.relative_local_file_path_components
+        )
 
 
 class CreateLocalDirectory(GetAction):
@@ -148,6 +329,7 @@ class CreateLocalDirectory(GetAction):
     Args:
         relative_local_directory_path_components (Sequence[str]): Relative local directory path components to make.
     """
+    __slots__ = ('relative_local_directory_path_components',)
 
     def __init__(
             self,
@@ -165,15 +347,18 @@ class CreateLocalDirectory(GetAction):
         return self.__class__, (self.relative_local_directory_path_components,)
 
     def __hash__(self):
-        return hash(self.__reduce__())
+        return hash((self.__class__, self.relative_local_directory_path_components))
 
     def __eq__(self, other):
-        return self.__reduce__() == other.__reduce__()
+        return (
+                self.__class__ is other.__class__
+                and self.relative_local_directory_path_components == other.relative_local_directory_path_components
+        )
 
 
 class PutAction(object):
     """Base class for actions required in put (upload) operations."""
-    pass
+    __slots__ = ()
 
 
 class UploadLocalFile(PutAction):
@@ -184,6 +369,7 @@ class UploadLocalFile(PutAction):
         local_file_path (str): Local file path.
         relative_remote_file_path_components (Sequence[str]): Relative remote file path components to save file as.
     """
+    __slots__ = ('local_file_path', 'relative_remote_file_path_components')
 
     def __init__(
             self,
@@ -204,10 +390,14 @@ class UploadLocalFile(PutAction):
         return self.__class__, (self.local_file_path, self.relative_remote_file_path_components)
 
     def __hash__(self):
-        return hash(self.__reduce__())
+        return hash((self.__class__, self.local_file_path, self.relative_remote_file_path_components))
 
     def __eq__(self, other):
-        return self.__reduce__() == other.__reduce__()
+        return (
+                self.__class__ is other.__class__
+                and self.local_file_path == other.local_file_path
+                and self.relative_remote_file_path_components == other.relative_remote_file_path_components
+        )
 
 
 class CreateRemoteDirectory(PutAction):
@@ -217,6 +407,7 @@ class CreateRemoteDirectory(PutAction):
     Args:
         relative_remote_directory_path_components (Sequence[str]): Relative remote directory path components to make.
     """
+    __slots__ = ('relative_remote_directory_path_components',)
 
     def __init__(
             self,
@@ -234,92 +425,379 @@ class CreateRemoteDirectory(PutAction):
         return self.__class__, (self.relative_remote_directory_path_components,)
 
     def __hash__(self):
-        return hash(self.__reduce__())
+        return hash((self.__class__, self.relative_remote_directory_path_components))
 
     def __eq__(self, other):
-        return self.__reduce__() == other.__reduce__()
+        return (
+                self.__class__ is other.__class__
+                and self.relative_remote_directory_path_components == other.relative_remote_directory_path_components
+        )
+
+
+class BinaryFileChunks(object):
+    """
+    Iterable over fixed-size chunks of a binary file with a known length, used as a request body.
+    As it has a length, requests sends it with a Content-Length header instead of chunked transfer encoding.
+
+    Where possible, contents of at least MEMORY_MAP_MIN_SIZE bytes are memory-mapped and the mapping is the only chunk,
+    so the HTTP layer hands it to a single socket sendall() call that copies from the page cache within C,
+    and file contents are never copied into intermediate bytes objects.
+    Smaller files are read, as mapping them saves little.
+
+    A mapped file must not be truncated while it is uploaded (e.g. by log rotation):
+    touching a mapped page past the new end of the file kills the process with SIGBUS,
+    where reading would merely come up short and raise IOError.
+
+    It can be rewound to its start with `tell` and `seek`, which requests uses to resend the body
+    when following a 307 or 308 redirect, provided the file itself can seek.
+
+    Args:
+        binary_file (BinaryIO): Open file object to read from.
+        content_length (int): Number of bytes to read.
+        chunk_size (int): Maximum size of each chunk if the file cannot be memory-mapped.
+    """
+    __slots__ = ('binary_file', 'content_length', 'chunk_size', 'start_position')
+
+    def __init__(
+            self,
+            binary_file,  # type: BinaryIO
+            content_length,  # type: int
+            chunk_size=CHUNK_SIZE,  # type: int
+    ):
+        self.binary_file = binary_file  # type: BinaryIO
+        self.content_length = content_length  # type: int
+        self.chunk_size = chunk_size  # type: int
+
+        # Where the body starts in the file, or None if the file cannot tell (e.g. a pipe)
+        try:
+            self.start_position = binary_file.tell()  # type: Optional[int]
+        except (EnvironmentError, AttributeError, ValueError):
+            self.start_position = None
+
+    def __len__(self):
+        return self.content_length
+
+    def tell(self):
+        # type: () -> int
+        """
+        Return the position within the body to rewind to.
+
+        Returns:
+            int: Always 0, the start of the body.
+        """
+        return 0
+
+    def seek(
+            self,
+            offset,  # type: int
+    ):
+        """
+        Rewind the body to its start, so that iterating over it again yields the whole body again.
+
+        Args:
+            offset (int): Position within the body, which must be 0.
+
+        Raises:
+            IOError: If the body cannot be rewound.
+        """
+        if offset != 0 or self.start_position is None:
+            raise IOError('Cannot rewind the body to position %d' % offset)
+        self.binary_file.seek(self.start_position)
+
+    def __iter__(self):
+        mapped_contents = self.map_contents()
+        if mapped_contents is not None:
+            yield mapped_contents
+            self.binary_file.seek(self.content_length, os.SEEK_CUR)
+        else:
+            remaining = self.content_length
+            while remaining > 0:
+                chunk = self.binary_file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    raise IOError('File ended %d bytes before its expected length' % remaining)
+                remaining -= len(chunk)
+                yield chunk
+
+    def map_contents(self):
+        # type: (...) -> Optional[memoryview]
+        """
+        Memory-map the contents to upload, starting at the file's current position.
+
+        Returns:
+            Optional[memoryview]: View over the mapped contents, or None if the file is not worth mapping
+                (shorter than MEMORY_MAP_MIN_SIZE) or cannot be mapped
+                (e.g. pipes, files shorter than expected, or Python 2's mmap lacking the buffer protocol).
+        """
+        if self.content_length < MEMORY_MAP_MIN_SIZE:
+            return None
+
+        try:
+            position = self.binary_file.tell()
+            mapped_file = mmap.mmap(
+                self.binary_file.fileno(),
+                position + self.content_length,
+                access=mmap.ACCESS_READ,
+            )
+            # The mapping is released once the view and all slices of it are garbage collected
+            # Closing it explicitly would fail while the HTTP layer still references the view
+            return memoryview(mapped_file)[position:position + self.content_length]
+        except (EnvironmentError, TypeError, ValueError):
+            return None
+
+
+def write_fully(
+        destination,  # type: BinaryIO
+        data,  # type: memoryview
+):
+    # type: (...) -> None
+    """
+    Write all of the data to a writable binary stream,
+    as the write() of an unbuffered (raw) file may write only part of what it is given.
+
+    Args:
+        destination (BinaryIO): Stream to write to.
+        data (memoryview): Data to write.
+    """
+    while data:
+        number_of_bytes_written = destination.write(data)
+        # Python 2 file objects return None, having written everything
+        if number_of_bytes_written is None:
+            break
+        if not number_of_bytes_written:
+            raise IOError('Stream accepted none of the remaining %d bytes' % len(data))
+        data = data[number_of_bytes_written:]
+
+
+# Reusable CHUNK_SIZE buffers for copying downloads, one per concurrent download at most
+chunk_buffers = Queue()  # type: Queue[bytearray]
+
+
+def copy_through_pooled_buffer(
+        source,  # type: BinaryIO
+        destination,  # type: BinaryIO
+):
+    # type: (...) -> None
+    """
+    Copy a readable binary stream to a writable one through a buffer borrowed from a shared pool,
+    so no buffer is allocated per chunk or per copy.
+
+    Args:
+        source (BinaryIO): Stream to read from until its end, supporting `readinto`.
+        destination (BinaryIO): Stream to write to.
+    """
+    try:
+        chunk_buffer = chunk_buffers.get_nowait()
+    except Empty:
+        chunk_buffer = bytearray(CHUNK_SIZE)
+
+    try:
+        chunk_buffer_view = memoryview(chunk_buffer)
+        # Look up the bound method once rather than per chunk
+        readinto = source.readinto
+        while True:
+            number_of_bytes = readinto(chunk_buffer)
+            if not number_of_bytes:
+                break
+            write_fully(destination=destination, data=chunk_buffer_view[:number_of_bytes])
+    finally:
+        chunk_buffers.put(chunk_buffer)
+
+
+def copy_through_sized_buffer(
+        source,  # type: BinaryIO
+        destination,  # type: BinaryIO
+        content_length,  # type: int
+):
+    # type: (...) -> None
+    """
+    Copy a readable binary stream of a known length to a writable one
+    by reading all of it into a single buffer of exactly that length and writing it at once.
+
+    Args:
+        source (BinaryIO): Stream to read `content_length` bytes from, supporting `readinto`.
+        destination (BinaryIO): Stream to write to.
+        content_length (int): Number of bytes to copy.
+    """
+    content_buffer = bytearray(content_length)
+    content_buffer_view = memoryview(content_buffer)
+    number_of_bytes_read = 0
+    while number_of_bytes_read < content_length:
+        number_of_bytes = source.readinto(content_buffer_view[number_of_bytes_read:])
+        if not number_of_bytes:
+            raise IOError('Stream ended %d bytes before its expected length' % (content_length - number_of_bytes_read))
+        number_of_bytes_read += number_of_bytes
+    write_fully(destination=destination, data=content_buffer_view)
+
+
+def is_identity_encoded(
+        response,  # type: requests.Response
+):
+    # type: (...) -> bool
+    """
+    Tell whether a response body is sent as stored, i.e. its raw stream needs no Content-Encoding (e.g. gzip) decoded.
+    Servers may ignore a request for the identity encoding.
+
+    Args:
+        response (requests.Response): The response.
+
+    Returns:
+        bool: True if the response has no Content-Encoding or the identity one, False otherwise.
+    """
+    return response.headers.get('Content-Encoding', '').strip().lower() in ('', 'identity')
+
+
+interned_path_components = {}  # type: Dict[str, str]
+
+
+def intern_path_component(
+        path_component,  # type: str
+):
+    # type: (...) -> str
+    """
+    Return the canonical instance of a path component,
+    so that a name recurring across many paths of a large tree is stored once.
+
+    Args:
+        path_component (str): Path segment.
+
+    Returns:
+        str: Equal path segment, shared with earlier callers.
+    """
+    interned_path_component = interned_path_components.get(path_component)
+    if interned_path_component is None:
+        if len(interned_path_components) >= INTERNED_PATH_COMPONENTS_SIZE:
+            interned_path_components.clear()
+        interned_path_component = interned_path_components.setdefault(path_component, path_component)
+    return interned_path_component
 
 
 def relative_local_path_to_relative_local_path_components(
         relative_local_path,  # type: str
 ):
-    # type: (...) -> Sequence[str]
+    # type: (...) -> Tuple[str, ...]
     """
-    Split and normalize a relative local path string into a list of path components.
+    Split and normalize a relative local path string into a tuple of path components.
 
     Args:
         relative_local_path (str): The relative local path string.
 
     Returns:
-        Sequence[str]: List of normalized path components.
+        Tuple[str, ...]: Tuple of normalized path components.
     """
-    components = COWList()
+    components = []
     verbs = compile_to_fspathverbs(path=relative_local_path, split=os.path.split)
     for verb in verbs:
         if isinstance(verb, Parent):
             if components:
-                components, _ = components.pop()
+                components.pop()
             else:
                 raise ValueError('Invalid relative local path: %s' % relative_local_path)
         elif isinstance(verb, Current):
             pass
         elif isinstance(verb, Child):
-            components = components.append(verb.child)
+            components.append(intern_path_component(verb.child))
         else:
             raise ValueError('Invalid relative local path: %s' % relative_local_path)
 
-    return components
+    return tuple(components)
 
 
+def split_posix_path_without_dot_components(
+        path,  # type: str
+):
+    # type: (...) -> Optional[Tuple[str, ...]]
+    """
+    Split a posix style path string into a tuple of path components, if it needs no normalization beyond dropping
+    empty components (i.e. it has no '.' or '..' components).
+
+    Args:
+        path (str): The posix style path string.
+
+    Returns:
+        Optional[Tuple[str, ...]]: Tuple of path components, or None if the path has '.' or '..' components.
+    """
+    components = path.split('/')
+    if '.' in components or '..' in components:
+        return None
+    else:
+        # filter(None, ...) drops the empty components within C
+        return tuple(filter(None, components))
+
+
+@lru_cache(maxsize=4096)
 def remote_path_to_remote_path_components(
         remote_path,  # type: str
 ):
-    # type: (...) -> COWList[str]
+    # type: (...) -> Tuple[str, ...]
     """
-    Split and normalize a remote (posix style) path string into a list of path components.
+    Split and normalize a remote (posix style) path string into a tuple of path components.
 
     Args:
         remote_path (str): The remote file/directory path string.
 
     Returns:
-        COWList[str]: List of normalized path components.
+        Tuple[str, ...]: Tuple of normalized path components.
     """
-    components = COWList()
+    # Fast path: nothing to normalize
+    components = split_posix_path_without_dot_components(remote_path)
+    if components is not None:
+        return tuple(map(intern_path_component, components))
+
+    components = []
     verbs = compile_to_fspathverbs(path=remote_path, split=posixpath.split)
     for verb in verbs:
         if isinstance(verb, Root):
-            components = components.clear()
+            del components[:]
         elif isinstance(verb, Parent):
             if components:
-                components, _ = components.pop()
+                components.pop()
             else:
                 raise ValueError('Invalid remote path: %s' % remote_path)
         elif isinstance(verb, Current):
             pass
         elif isinstance(verb, Child):
-            components = components.append(verb.child)
+            components.append(intern_path_component(verb.child))
 
-    return components
+    return tuple(components)
 
 
-def remote_path_components_to_href(
-        host,  # type: str
-        port,  # type: int
-        remote_path_components,  # type: Sequence[str]
+@lru_cache(maxsize=8192)
+def quote_remote_path_component(
+        remote_path_component,  # type: str
 ):
     # type: (...) -> str
     """
-    Convert remote path components to a full HTTP WebDAV HREF.
+    Percent-encode a single remote path component. Memoized, as the same components recur across a traversal.
 
     Args:
-        host (str): Hostname.
-        port (int): Port.
-        remote_path_components (Sequence[str]): List of path segments.
+        remote_path_component (str): Path segment.
+
+    Returns:
+        str: Percent-encoded path segment.
+    """
+    if UNRESERVED_REMOTE_PATH_COMPONENT_RE.match(remote_path_component):
+        return remote_path_component
+    else:
+        return quote(remote_path_component)
+
+
+def unquote_remote_path_component(
+        quoted_remote_path_component,  # type: str
+):
+    # type: (...) -> str
+    """
+    Decode a single percent-encoded remote path component.
+
+    Args:
+        quoted_remote_path_component (str): Percent-encoded path segment.
 
     Returns:
-        str: HTTP HREF string.
+        str: Decoded path segment.
     """
-    return 'http://%s:%d/%s' % (host, port, '/'.join(map(quote, remote_path_components)))
+    if '%' not in quoted_remote_path_component:
+        return quoted_remote_path_component
+    else:
+        return unquote(quoted_remote_path_component)
 
 
 def href_to_remote_path_components(
@@ -327,7 +805,7 @@ def href_to_remote_path_components(
         port,  # type: int
         href,  # type: str
 ):
-    # type: (...) -> COWList[str]
+    # type: (...) -> Tuple[str, ...]
     """
     Convert a HREF to remote path components.
 
@@ -337,39 +815,51 @@ def href_to_remote_path_components(
         href (str): WebDAV resource HREF.
 
     Returns:
-        COWList[str]: List of decoded path segments.
+        Tuple[str, ...]: Tuple of decoded path segments.
     """
     base = 'http://%s:%d' % (host, port)
-    if href.startswith(base):
+    # The base must end at a path boundary, or e.g. port 8080 would match http://localhost:80801/
+    if href.startswith(base) and (len(href) == len(base) or href[len(base)] == '/'):
         # base_href resembles http://localhost:8080/foo/bar
-        relative_path = posixpath.relpath(href, base)
+        # Already known to start with the base, so slice it off instead of computing a relpath
+        relative_path = href[len(base):].lstrip('/')
     elif href.startswith('/'):
         # base_href resembles /foo/bar
         relative_path = href[1:]
     else:
         raise ValueError('Invalid href: %s' % href)
 
-    components = COWList()
+    # Fast path: nothing to normalize
+    # A leading '/' would be a root, which is invalid and reported below
+    if not relative_path.startswith('/'):
+        quoted_components = split_posix_path_without_dot_components(relative_path)
+        if quoted_components is not None:
+            return tuple(
+                intern_path_component(unquote_remote_path_component(quoted_component))
+                for quoted_component in quoted_components
+            )
+
+    components = []
     verbs = compile_to_fspathverbs(path=relative_path, split=posixpath.split)
     for verb in verbs:
         if isinstance(verb, Root):
             raise ValueError('Invalid href: %s' % href)
         elif isinstance(verb, Parent):
             if components:
-                components, _ = components.pop()
+                components.pop()
             else:
                 raise ValueError('Invalid href: %s' % href)
         elif isinstance(verb, Current):
             pass
         elif isinstance(verb, Child):
-            components = components.append(unquote(verb.child))
+            components.append(intern_path_component(unquote_remote_path_component(verb.child)))
 
-    return components
+    return tuple(components)
 
 
 def iterate_put_actions(
         local_path,  # type: str,
-        relative_remote_path_prefix=COWList(),  # type: COWList[str]
+        relative_remote_path_prefix=(),  # type: Tuple[str, ...]
 ):
     # type: (...) -> Iterator[PutAction]
     """
@@ -378,7 +868,7 @@ def iterate_put_actions(
 
     Args:
         local_path (str): Local file or directory to upload.
-        relative_remote_path_prefix (COWList[str], optional): Path prefix on the remote side.
+        relative_remote_path_prefix (Tuple[str, ...], optional): Path prefix on the remote side.
 
     Yields:
         PutAction: UploadLocalFile or CreateRemoteDirectory actions.
@@ -386,44 +876,189 @@ def iterate_put_actions(
     absolute_local_path = os.path.abspath(local_path)
     basename = os.path.basename(absolute_local_path)
 
-    if basename and os.path.isfile(absolute_local_path):
+    # A single stat instead of one in os.path.isfile and another in os.path.isdir
+    try:
+        mode = os.stat(absolute_local_path).st_mode
+    except OSError:
+        mode = 0
+
+    if basename and stat.S_ISREG(mode):
         yield UploadLocalFile(
             local_file_path=absolute_local_path,
-            relative_remote_file_path_components=relative_remote_path_prefix.append(basename),
+            relative_remote_file_path_components=relative_remote_path_prefix + (basename,),
         )
-    elif basename and os.path.isdir(absolute_local_path):
-        relative_remote_path_prefix_with_basename = relative_remote_path_prefix.append(basename)
+    elif basename and stat.S_ISDIR(mode):
+        relative_remote_path_prefix_with_basename = relative_remote_path_prefix + (basename,)
         yield CreateRemoteDirectory(
             relative_remote_directory_path_components=relative_remote_path_prefix_with_basename,
         )
-        for dirpath, dirnames, filenames in os.walk(absolute_local_path):
-            relative_local_path_components = relative_local_path_to_relative_local_path_components(
-                relative_local_path=os.path.relpath(dirpath, absolute_local_path),
-            )
 
-            new_relative_remote_path_prefix = relative_remote_path_prefix_with_basename.extend(
-                relative_local_path_components
-            )
+        # Walk the directory tree with scandir
+        # Each directory entry caches its file type, so no path is joined or stat'ed again
+        stack = [(absolute_local_path, relative_remote_path_prefix_with_basename)]
+        while stack:
+            local_directory_path, relative_remote_directory_path_components = stack.pop()
+
+            # Like os.walk, silently skip directories that cannot be listed (e.g. for lack of permission)
+            try:
+                entries = list(scandir(local_directory_path))
+            except OSError:
+                continue
+
+            directory_entries = []
+            file_entries = []
+            for entry in entries:
+                # Like os.walk, treat entries whose type cannot be determined as files
+                try:
+                    is_directory = entry.is_dir()
+                except OSError:
+                    is_directory = False
+
+                if is_directory:
+                    directory_entries.append(entry)
+                else:
+                    file_entries.append(entry)
 
-            for dirname in dirnames:
+            subdirectories = []
+            for entry in directory_entries:
+                relative_remote_subdirectory_path_components = relative_remote_directory_path_components + (entry.name,)
                 yield CreateRemoteDirectory(
-                    relative_remote_directory_path_components=new_relative_remote_path_prefix.append(dirname),
+                    relative_remote_directory_path_components=relative_remote_subdirectory_path_components,
                 )
+                # Like os.walk, do not descend into symbolic links to directories
+                if not entry.is_symlink():
+                    subdirectories.append((entry.path, relative_remote_subdirectory_path_components))
 
-            for filename in filenames:
+            # Pushed in reverse, so that subdirectories are walked in listing order, as os.walk does
+            stack.extend(reversed(subdirectories))
+
+            for entry in file_entries:
                 yield UploadLocalFile(
-                    local_file_path=os.path.join(dirpath, filename),
-                    relative_remote_file_path_components=new_relative_remote_path_prefix.append(filename),
+                    local_file_path=entry.path,
+                    relative_remote_file_path_components=relative_remote_directory_path_components + (entry.name,),
                 )
     else:
         raise ValueError('Invalid local path: %s' % local_path)
 
 
+def plan_get_actions(
+        remote_path_components,  # type: Tuple[str, ...]
+        relative_local_path_prefix,  # type: Tuple[str, ...]
+        list_result,  # type: ListResult
+):
+    # type: (...) -> Tuple[List[GetAction], List[Tuple[Tuple[str, ...], Tuple[str, ...]]]]
+    """
+    Plan the actions required to get a listed remote file or directory, without descending into subdirectories.
+
+    Args:
+        remote_path_components (Tuple[str, ...]): Path to remote file or directory.
+        relative_local_path_prefix (Tuple[str, ...]): Relative local path prefix for the current level.
+        list_result (ListResult): Listing of the remote file or directory.
+
+    Returns:
+        Tuple[List[GetAction], List[Tuple[Tuple[str, ...], Tuple[str, ...]]]]: Actions for the current level, and
+            (remote path components, relative local path prefix) of each subdirectory still to get.
+    """
+    get_actions = []  # type: List[GetAction]
+    subdirectories = []  # type: List[Tuple[Tuple[str, ...], Tuple[str, ...]]]
+
+    if isinstance(list_result, IsFile):
+        remote_file_path_components = list_result.file_path_components
+        get_actions.append(
+            DownloadRemoteFile(
+                remote_file_path_components=remote_file_path_components,
+                relative_local_file_path_components=relative_local_path_prefix + (remote_file_path_components[-1],)
+            )
+        )
+    elif isinstance(list_result, IsDirectory):
+        if not remote_path_components:
+            # This remote directory is root
+            # Do not change local path prefix
+            new_relative_local_path_prefix = relative_local_path_prefix
+        else:
+            # This remote directory is not root
+            # Update the local path prefix with the remote directory name
+            # Make a corresponding local directory
+            new_relative_local_path_prefix = relative_local_path_prefix + (remote_path_components[-1],)
+            get_actions.append(
+                CreateLocalDirectory(relative_local_directory_path_components=new_relative_local_path_prefix)
+            )
+
+        # Download containing files to new local path prefix
+        for file_path_components in list_result.containing_file_path_components:
+            get_actions.append(
+                DownloadRemoteFile(
+                    remote_file_path_components=file_path_components,
+                    relative_local_file_path_components=new_relative_local_path_prefix + (file_path_components[-1],)
+                )
+            )
+
+        # Get containing directories to new local path prefix
+        for directory_path_components in list_result.containing_directory_path_components:
+            subdirectories.append((directory_path_components, new_relative_local_path_prefix))
+
+    return get_actions, subdirectories
+
+
+def iterate_indices_of_completed_futures(
+        futures,  # type: Sequence[Future]
+):
+    # type: (...) -> Iterator[int]
+    """
+    Wait for the futures in order, yielding the index of each that completed successfully.
+    At the first failure, the futures not yet started are cancelled and those already running are waited for,
+    the indices of those that completed are yielded, and the failure is re-raised,
+    so that the caller can fail fast while still reporting everything that was done.
+
+    Args:
+        futures (Sequence[Future]): Futures in the order to report them.
+
+    Yields:
+        int: Index of each future that completed successfully.
+    """
+    for index, future in enumerate(futures):
+        if future.exception() is not None:
+            for later_future in futures[index + 1:]:
+                later_future.cancel()
+            for later_index in range(index + 1, len(futures)):
+                later_future = futures[later_index]
+                if not later_future.cancelled() and later_future.exception() is None:
+                    yield later_index
+            # Re-raise the failure
+            future.result()
+        yield index
+
+
+def have_nested_remote_paths(
+        remote_paths_components,  # type: Sequence[Tuple[str, ...]]
+):
+    # type: (...) -> bool
+    """
+    Tell whether any of the remote paths is the same as, or nested within, another.
+
+    Args:
+        remote_paths_components (Sequence[Tuple[str, ...]]): Path components of each remote path.
+
+    Returns:
+        bool: True if a path is the same as, or nested within, another, False otherwise.
+    """
+    # Sorted, every path nested within another follows that path or a path nested within it
+    sorted_remote_paths_components = sorted(remote_paths_components)
+    for remote_path_components, next_remote_path_components in zip(
+            sorted_remote_paths_components,
+            sorted_remote_paths_components[1:],
+    ):
+        if next_remote_path_components[:len(remote_path_components)] == remote_path_components:
+            return True
+    return False
+
+
 class SimpleDAVClient(object):
     def __init__(
             self,
             host='localhost',  # type: str
             port=8080,  # type: int
+            max_workers=16,  # type: int
     ):
         """
         Initialize the client with host and port.
@@ -431,16 +1066,113 @@ class SimpleDAVClient(object):
         Args:
             host (str): WebDAV server hostname.
             port (int): WebDAV server port.
+            max_workers (int): Maximum number of requests issued concurrently by bulk operations.
         """
         self.host = host  # type: str
         self.port = port  # type: int
+        self.max_workers = max_workers  # type: int
         self.session = requests.session()
+        # All requests go to a single host, so a single pool of keep-alive connections
+        # It is large enough for every worker, so concurrent requests don't reopen sockets
+        # When operations run concurrently, further requests wait for a pooled connection instead of opening more
+        self.session.mount(
+            'http://',
+            HTTPAdapter(pool_connections=1, pool_maxsize=max(max_workers, CONNECTION_POOL_SIZE), pool_block=True)
+        )
+        self.base_href = 'http://%s:%d/' % (host, port)  # type: str
+        self.hrefs = {}  # type: Dict[Tuple[str, ...], str]
+
+    def close(self):
+        """Close the pooled keep-alive connections to the server."""
+        self.session.close()
+
+    def remote_path_components_to_href(
+            self,
+            remote_path_components,  # type: Sequence[str]
+    ):
+        # type: (...) -> str
+        """
+        Convert remote path components to a full HTTP WebDAV HREF on this client's server.
+        Results are memoized, as recursive operations revisit the same paths.
+
+        Args:
+            remote_path_components (Sequence[str]): List of path segments.
+
+        Returns:
+            str: HTTP HREF string.
+        """
+        remote_path_components = tuple(remote_path_components)
+        href = self.hrefs.get(remote_path_components)
+        if href is None:
+            if len(self.hrefs) >= HREF_CACHE_SIZE:
+                self.hrefs.clear()
+            href = self.base_href + '/'.join(
+                quote_remote_path_component(remote_path_component) for remote_path_component in remote_path_components
+            )
+            self.hrefs[remote_path_components] = href
+        return href
 
     # These methods directly make requests
     # These methods operate on sanitized path components
+    def open_propfind_from_remote_path_components(
+            self,
+            remote_path_components,  # type: Sequence[str]
+            depth='1',  # type: str
+    ):
+        # type: (...) -> requests.Response
+        """
+        Send a PROPFIND for the resource type of the target and, depending on depth, its descendants,
+        without reading the response body.
+
+        Args:
+            remote_path_components (Sequence[str]): Normalized path components of the target.
+            depth (str): PROPFIND depth, '1' for the target and its children, 'infinity' for all its descendants.
+
+        Returns:
+            requests.Response: Streamed response, a 207 Multi-Status on success. The caller must close the response.
+        """
+        remote_path_href = self.remote_path_components_to_href(remote_path_components=remote_path_components)
+
+        return self.session.request(
+            method='PROPFIND',
+            url=remote_path_href,
+            headers={'Depth': depth, 'Content-Type': 'application/xml; charset="utf-8"'},
+            data=PROPFIND_RESOURCETYPE_BODY,
+            stream=True,
+        )
+
+    def iterate_listings_is_directories_and_statuses(
+            self,
+            response,  # type: requests.Response
+    ):
+        # type: (...) -> Iterator[Tuple[Tuple[str, ...], bool, str]]
+        """
+        Iterate over the resources in a 207 Multi-Status PROPFIND response,
+        yielding (path_components, is_directory, status) for each.
+
+        Args:
+            response (requests.Response): Streamed 207 Multi-Status response to a PROPFIND.
+
+        Yields:
+            Tuple[Tuple[str, ...], bool, str]: (path_components, is_directory, status) for each resource,
+                where status is the resource's own DAV:status, or '' if it has none.
+        """
+        # Parse the body incrementally as it arrives, keeping only one response node in memory at a time
+        response.raw.decode_content = True
+        for dav_response_dav_href, is_collection, dav_response_dav_status in iterate_hrefs_is_collections_and_statuses(
+                response.raw
+        ):
+            if dav_response_dav_href:
+                yield href_to_remote_path_components(
+                    host=self.host,
+                    port=self.port,
+                    href=dav_response_dav_href
+                ), is_collection, dav_response_dav_status
+
     def iterate_listings_and_is_directories(
             self,
             remote_path_components,  # type: Sequence[str]
+            depth='1',  # type: str
     ):
         # type: (...) -> Iterator[Tuple[Sequence[str], bool]]
         """
@@ -449,48 +1181,22 @@ class SimpleDAVClient(object):
 
         Args:
             remote_path_components (Sequence[str]): Normalized path components of the target.
+            depth (str): PROPFIND depth, '1' for the target and its children, 'infinity' for all its descendants.
 
         Yields:
             Tuple[Sequence[str], bool]: (path_components, is_directory) for each child resource.
         """
-        remote_path_href = remote_path_components_to_href(
-            host=self.host,
-            port=self.port,
-            remote_path_components=remote_path_components
-        )
-
-        response = self.session.request(
-            method='PROPFIND',
-            url=remote_path_href,
-            headers={'Depth': '1'},
+        response = self.open_propfind_from_remote_path_components(
+            remote_path_components=remote_path_components,
+            depth=depth,
         )
 
-        if response.status_code == 207:
-            tree = ElementTree.fromstring(response.content)
-            for dav_response_node in tree.findall('{DAV:}response'):
-                dav_response_dav_href_node = dav_response_node.find('.//{DAV:}href')
-                if dav_response_dav_href_node is not None:
-                    dav_response_dav_href = dav_response_dav_href_node.text
-                    if dav_response_dav_href is not None:
-                        dav_response_dav_collection_node = dav_response_node.find('.//{DAV:}collection')
-                        dav_response_dav_resourcetype_node = dav_response_node.find('.//{DAV:}resourcetype')
-                        if dav_response_dav_resourcetype_node is not None:
-                            dav_response_dav_resourcetype_dav_collection_node = dav_response_dav_resourcetype_node.find(
-                                '{DAV:}collection'
-                            )
-                        else:
-                            dav_response_dav_resourcetype_dav_collection_node = None
-
-                        is_collection = (
-                                dav_response_dav_collection_node is not None
-                                or dav_response_dav_resourcetype_dav_collection_node is not None
-                        )
-
-                        yield href_to_remote_path_components(
-                            host=self.host,
-                            port=self.port,
-                            href=dav_response_dav_href
-                        ), is_collection
+        try:
+            if response.status_code == 207:
+                for listing, is_directory, _ in self.iterate_listings_is_directories_and_statuses(response=response):
+                    yield listing, is_directory
+        finally:
+            response.close()
 
     def create_directory_from_remote_path_components(
             self,
@@ -506,11 +1212,7 @@ class SimpleDAVClient(object):
         Returns:
             bool: True on success, False otherwise.
         """
-        remote_path_href = remote_path_components_to_href(
-            host=self.host,
-            port=self.port,
-            remote_path_components=remote_path_components
-        )
+        remote_path_href = self.remote_path_components_to_href(remote_path_components=remote_path_components)
 
         response = self.session.request(
             method='MKCOL',
@@ -526,6 +1228,7 @@ class SimpleDAVClient(object):
             self,
             binary_file,  # type: BinaryIO
             remote_path_components,  # type: Sequence[str]
+            content_length=None,  # type: Optional[int]
     ):
         # type: (...) -> bool
         """
@@ -534,20 +1237,23 @@ class SimpleDAVClient(object):
         Args:
             binary_file (BinaryIO): Open file object to upload.
             remote_path_components (Sequence[str]): Path components for the new file.
+            content_length (Optional[int]): Number of bytes to upload from the file object, if known.
+                The file object is then sent in large chunks with a Content-Length header.
 
         Returns:
             bool: True if the upload was successful, False otherwise.
         """
-        remote_path_href = remote_path_components_to_href(
-            host=self.host,
-            port=self.port,
-            remote_path_components=remote_path_components
-        )
+        remote_path_href = self.remote_path_components_to_href(remote_path_components=remote_path_components)
+
+        if content_length is None:
+            data = binary_file
+        else:
+            data = BinaryFileChunks(binary_file=binary_file, content_length=content_length)
 
         response = self.session.request(
             method='PUT',
             url=remote_path_href,
-            data=binary_file,
+            data=data,
         )
 
         if response.status_code in (200, 201, 204):
@@ -555,35 +1261,111 @@ class SimpleDAVClient(object):
         else:
             return False
 
-    def get_file_from_remote_path_components(
+    def open_file_from_remote_path_components(
             self,
             remote_path_components,  # type: Sequence[str]
     ):
-        # type: (...) -> Iterator[bytes]
+        # type: (...) -> Optional[requests.Response]
         """
-        Stream and yield the contents of a file from the given remote path.
+        Start downloading a file from the given remote path, without reading its contents.
 
         Args:
             remote_path_components (Sequence[str]): Path components of the file.
 
-        Yields:
-            bytes: Chunks of file data.
+        Returns:
+            Optional[requests.Response]: Streamed response whose `raw` attribute is a file-like object over the file
+                contents, or None if the file could not be downloaded. The caller must close the response.
         """
-        remote_path_href = remote_path_components_to_href(
-            host=self.host,
-            port=self.port,
-            remote_path_components=remote_path_components
-        )
+        remote_path_href = self.remote_path_components_to_href(remote_path_components=remote_path_components)
 
+        # Ask for the body as stored, so it can be read straight from the raw stream without a decoding layer
         response = self.session.request(
             method='GET',
             url=remote_path_href,
+            headers={'Accept-Encoding': 'identity'},
             stream=True,
         )
 
         if response.status_code == 200:
-            for chunk in response.iter_content(chunk_size=None):
-                yield chunk
+            return response
+        else:
+            response.close()
+            return None
+
+    def copy_file_from_remote_path_components(
+            self,
+            remote_path_components,  # type: Sequence[str]
+            binary_file,  # type: BinaryIO
+    ):
+        # type: (...) -> bool
+        """
+        Copy the contents of a file from the given remote path straight into a binary file.
+
+        Args:
+            remote_path_components (Sequence[str]): Path components of the file.
+            binary_file (BinaryIO): Binary file to write the contents to.
+
+        Returns:
+            bool: True if the file was copied, False if it could not be downloaded.
+        """
+        response = self.open_file_from_remote_path_components(remote_path_components=remote_path_components)
+        if response is None:
+            return False
+        try:
+            # An encoded body must go through the decoding layer, and its Content-Length is not the file's length
+            if not is_identity_encoded(response=response):
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    write_fully(destination=binary_file, data=memoryview(chunk))
+                return True
+
+            try:
+                content_length = int(response.headers.get('Content-Length', ''))
+            except ValueError:
+                content_length = None
+
+            # Small files take one exactly sized buffer and one write; larger or unsized ones stream through the pool
+            if content_length is not None and 0 <= content_length <= SIZED_DOWNLOAD_MAX_SIZE:
+                copy_through_sized_buffer(
+                    source=response.raw,
+                    destination=binary_file,
+                    content_length=content_length,
+                )
+            else:
+                copy_through_pooled_buffer(source=response.raw, destination=binary_file)
+        finally:
+            response.close()
+        return True
+
+    def get_file_from_remote_path_components(
+            self,
+            remote_path_components,  # type: Sequence[str]
+    ):
+        # type: (...) -> Iterator[bytes]
+        """
+        Stream and yield the contents of a file from the given remote path.
+        To write the contents to a file, `copy_file_from_remote_path_components` avoids a generator step per chunk.
+
+        Args:
+            remote_path_components (Sequence[str]): Path components of the file.
+
+        Yields:
+            bytes: Chunks of file data.
+        """
+        response = self.open_file_from_remote_path_components(remote_path_components=remote_path_components)
+        if response is not None:
+            try:
+                if is_identity_encoded(response=response):
+                    while True:
+                        chunk = response.raw.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        yield chunk
+                else:
+                    # An encoded body must go through the decoding layer
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        yield chunk
+            finally:
+                response.close()
 
     def delete_file_or_directory_from_remote_path_components(
             self,
@@ -598,11 +1380,7 @@ class SimpleDAVClient(object):
         Returns:
             bool: True if deletion succeeded, False otherwise.
         """
-        remote_path_href = remote_path_components_to_href(
-            host=self.host,
-            port=self.port,
-            remote_path_components=remote_path_components
-        )
+        remote_path_href = self.remote_path_components_to_href(remote_path_components=remote_path_components)
 
         response = self.session.request(
             method='DELETE',
@@ -630,27 +1408,125 @@ class SimpleDAVClient(object):
         Returns:
             ListResult: IsFile, IsDirectory, or NotFound.
         """
-        listings_to_is_directories = dict(
-            self.iterate_listings_and_is_directories(remote_path_components=remote_path_components)
-        )
-        if remote_path_components not in listings_to_is_directories:
+        remote_path_components = tuple(remote_path_components)
+        remote_path_is_directory = None
+        file_path_components = []
+        directory_path_components = []
+        for listing, is_directory in self.iterate_listings_and_is_directories(
+                remote_path_components=remote_path_components
+        ):
+            if listing == remote_path_components:
+                remote_path_is_directory = is_directory
+            elif is_directory:
+                directory_path_components.append(listing)
+            else:
+                file_path_components.append(listing)
+
+        if remote_path_is_directory is None:
             return NotFound()
-        elif not listings_to_is_directories[remote_path_components]:
+        elif not remote_path_is_directory:
             return IsFile(file_path_components=remote_path_components)
         else:
-            file_path_components = COWList()
-            directory_path_components = COWList()
-            del listings_to_is_directories[remote_path_components]
-            for listing, is_directory in listings_to_is_directories.items():
-                if is_directory:
-                    directory_path_components = directory_path_components.append(listing)
-                else:
-                    file_path_components = file_path_components.append(listing)
             return IsDirectory(
-                containing_file_path_components=file_path_components,
-                containing_directory_path_components=directory_path_components,
+                containing_file_path_components=tuple(file_path_components),
+                containing_directory_path_components=tuple(directory_path_components),
             )
 
+    def list_remote_tree(
+            self,
+            remote_path_components,  # type: Sequence[str]
+    ):
+        # type: (...) -> Optional[Dict[Tuple[str, ...], ListResult]]
+        """
+        List the remote file or directory at the given path and everything below it, with a single PROPFIND.
+
+        Some servers (e.g. SabreDAV) answer a Depth: infinity PROPFIND as if it were Depth: 1,
+        which is indistinguishable from a tree whose subdirectories are all empty.
+        So every directory listed as empty is confirmed to be empty with a Depth: 1 PROPFIND of its own.
+
+        Args:
+            remote_path_components (Sequence[str]): Path components of the file or directory.
+
+        Returns:
+            Optional[Dict[Tuple[str, ...], ListResult]]: IsFile or IsDirectory for each listed path,
+                or NotFound for the path only if it was not found,
+                or None if the server refuses to list at infinite depth or the listing is incomplete.
+        """
+        remote_path_components = tuple(remote_path_components)
+        number_of_components = len(remote_path_components)
+
+        listings_to_is_directories = {}  # type: Dict[Tuple[str, ...], bool]
+        response = self.open_propfind_from_remote_path_components(
+            remote_path_components=remote_path_components,
+            depth='infinity',
+        )
+        try:
+            # A missing path is missing at any depth, so there is no point in listing it again
+            if response.status_code == 404:
+                return {remote_path_components: NotFound()}
+            elif response.status_code != 207:
+                return None
+
+            for listing, is_directory, status in self.iterate_listings_is_directories_and_statuses(response=response):
+                # A failed resource (e.g. 507 Insufficient Storage for a truncated listing) leaves the tree incomplete
+                if not is_successful_dav_status(dav_status=status):
+                    return None
+                # Ignore anything outside of the listed path
+                if listing[:number_of_components] == remote_path_components:
+                    listings_to_is_directories[listing] = is_directory
+        finally:
+            response.close()
+
+        if remote_path_components not in listings_to_is_directories:
+            return None
+
+        # Group listings under their parent directories
+        directory_paths_to_file_paths = {}  # type: Dict[Tuple[str, ...], List[Tuple[str, ...]]]
+        directory_paths_to_directory_paths = {}  # type: Dict[Tuple[str, ...], List[Tuple[str, ...]]]
+        for listing, is_directory in listings_to_is_directories.items():
+            if listing != remote_path_components:
+                if is_directory:
+                    directory_paths_to_directory_paths.setdefault(listing[:-1], []).append(listing)
+                else:
+                    directory_paths_to_file_paths.setdefault(listing[:-1], []).append(listing)
+
+        listings_to_list_results = {}  # type: Dict[Tuple[str, ...], ListResult]
+        for listing, is_directory in listings_to_is_directories.items():
+            if is_directory:
+                listings_to_list_results[listing] = IsDirectory(
+                    containing_file_path_components=tuple(directory_paths_to_file_paths.get(listing, ())),
+                    containing_directory_path_components=tuple(directory_paths_to_directory_paths.get(listing, ())),
+                )
+            else:
+                listings_to_list_results[listing] = IsFile(file_path_components=listing)
+
+        # Confirm the empty directories concurrently, giving up on the whole listing at the first one that is not
+        empty_directory_paths = [
+            listing
+            for listing, list_result in listings_to_list_results.items()
+            if isinstance(list_result, IsDirectory)
+            and not list_result.containing_file_path_components
+            and not list_result.containing_directory_path_components
+        ]
+        if empty_directory_paths:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [
+                    executor.submit(self.list_remote_file_or_directory, empty_directory_path)
+                    for empty_directory_path in empty_directory_paths
+                ]
+                for future in futures:
+                    list_result = future.result()
+                    if (
+                            not isinstance(list_result, IsDirectory)
+                            or list_result.containing_file_path_components
+                            or list_result.containing_directory_path_components
+                    ):
+                        for pending_future in futures:
+                            pending_future.cancel()
+                        return None
+
+        return listings_to_list_results
+
     def create_directories_from_remote_path_components(
             self,
             remote_path_components,  # type: Sequence[str]
@@ -665,68 +1541,134 @@ class SimpleDAVClient(object):
         Returns:
             bool: True on total success, False otherwise.
         """
+        # Walk up from the final directory until making a directory succeeds
+        # In the common case, the parent directories already exist and the first attempt succeeds
         # The root directory always exists
-        if not remote_path_components:
-            return True
-        # Try directly making the final directory
-        elif self.create_directory_from_remote_path_components(remote_path_components=remote_path_components):
-            return True
-        # If that doesn't work, try making n-1 levels of directories
-        elif self.create_directories_from_remote_path_components(remote_path_components=remote_path_components[:-1]):
-            # Then try directly making the final directory again
-            return self.create_directory_from_remote_path_components(remote_path_components=remote_path_components)
-        else:
-            return False
+        number_of_existing_components = 0
+        for number_of_components in range(len(remote_path_components), 0, -1):
+            if self.create_directory_from_remote_path_components(
+                    remote_path_components=remote_path_components[:number_of_components]
+            ):
+                number_of_existing_components = number_of_components
+                break
+
+        # Then walk back down, making each remaining directory
+        for number_of_components in range(number_of_existing_components + 1, len(remote_path_components) + 1):
+            if not self.create_directory_from_remote_path_components(
+                    remote_path_components=remote_path_components[:number_of_components]
+            ):
+                return False
+
+        return True
+
+    def upload_local_file(
+            self,
+            local_file_path,  # type: str
+            remote_file_path_components,  # type: Sequence[str]
+    ):
+        # type: (...) -> bool
+        """
+        Upload a local file to the specified remote path.
+
+        Args:
+            local_file_path (str): Local file path.
+            remote_file_path_components (Sequence[str]): Path components for the new file.
+
+        Returns:
+            bool: True if the upload was successful, False otherwise.
+        """
+        with open(local_file_path, 'rb') as f:
+            return self.put_file_to_remote_path_components(
+                binary_file=f,
+                remote_path_components=remote_file_path_components,
+                content_length=os.fstat(f.fileno()).st_size,
+            )
+
+    def download_remote_file(
+            self,
+            remote_file_path_components,  # type: Sequence[str]
+            local_file_path,  # type: str
+    ):
+        # type: (...) -> bool
+        """
+        Download a remote file to the specified local path.
+
+        Args:
+            remote_file_path_components (Sequence[str]): Path components of the remote file.
+            local_file_path (str): Local file path to save the file as.
+
+        Returns:
+            bool: True if the download was successful, False otherwise.
+        """
+        # Unbuffered, as every write is already a whole chunk
+        with open(local_file_path, 'wb', 0) as f:
+            return self.copy_file_from_remote_path_components(
+                remote_path_components=remote_file_path_components,
+                binary_file=f,
+            )
 
     def iterate_get_actions(
             self,
             remote_path_components,  # type: Sequence[str],
-            relative_local_path_prefix=COWList(),  # type: COWList[str]
+            relative_local_path_prefix=(),  # type: Tuple[str, ...]
     ):
         # type: (...) -> Iterator[GetAction]
         """
         Generate a sequence of actions required to get a remote file or directory.
+        The whole tree is listed with a single PROPFIND if the server allows it,
+        otherwise remote directories are listed concurrently.
 
         Args:
             remote_path_components (Sequence[str]): Path to remote file or directory.
-            relative_local_path_prefix (COWList[str], optional): Relative local path prefix for the current level.
+            relative_local_path_prefix (Tuple[str, ...], optional): Relative local path prefix for the current level.
 
         Yields:
             GetAction: Either DownloadRemoteFile or MakeLocalDirectories.
         """
-        list_result = self.list_remote_file_or_directory(remote_path_components=remote_path_components)
-        if isinstance(list_result, IsFile):
-            remote_file_path_components = list_result.file_path_components
-            yield DownloadRemoteFile(
-                remote_file_path_components=remote_file_path_components,
-                relative_local_file_path_components=relative_local_path_prefix.append(remote_file_path_components[-1])
-            )
-        elif isinstance(list_result, IsDirectory):
-            if not remote_path_components:
-                # This remote directory is root
-                # Do not change local path prefix
-                new_relative_local_path_prefix = relative_local_path_prefix
-            else:
-                # This remote directory is not root
-                # Update the local path prefix with the remote directory name
-                # Make a corresponding local directory
-                new_relative_local_path_prefix = relative_local_path_prefix.append(remote_path_components[-1])
-                yield CreateLocalDirectory(relative_local_directory_path_components=new_relative_local_path_prefix)
-
-            # Download containing files to new local path prefix
-            for file_path_components in list_result.containing_file_path_components:
-                yield DownloadRemoteFile(
-                    remote_file_path_components=file_path_components,
-                    relative_local_file_path_components=new_relative_local_path_prefix.append(file_path_components[-1])
+        remote_path_components = tuple(remote_path_components)
+
+        # Try listing the whole tree with a single PROPFIND
+        listings_to_list_results = self.list_remote_tree(remote_path_components=remote_path_components)
+        if listings_to_list_results is not None:
+            stack = [(remote_path_components, relative_local_path_prefix)]
+            while stack:
+                remote_path_components, relative_local_path_prefix = stack.pop()
+                get_actions, subdirectories = plan_get_actions(
+                    remote_path_components=remote_path_components,
+                    relative_local_path_prefix=relative_local_path_prefix,
+                    list_result=listings_to_list_results[remote_path_components],
                 )
-
-            # Recurse on containing directories
-            for directory_path_components in list_result.containing_directory_path_components:
-                for get_action in self.iterate_get_actions(
-                        remote_path_components=directory_path_components,
-                        relative_local_path_prefix=new_relative_local_path_prefix,
-                ):
+                for get_action in get_actions:
                     yield get_action
+                stack.extend(reversed(subdirectories))
+            return
+
+        # Otherwise, list directories concurrently, one level at a time
+        # Each listing is submitted as soon as its parent's listing comes back
+        # Actions for a directory are yielded after those of its parent, but sibling subtrees may interleave
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {
+                executor.submit(self.list_remote_file_or_directory, remote_path_components): (
+                    remote_path_components,
+                    relative_local_path_prefix,
+                )
+            }
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    remote_path_components, relative_local_path_prefix = pending.pop(future)
+                    get_actions, subdirectories = plan_get_actions(
+                        remote_path_components=remote_path_components,
+                        relative_local_path_prefix=relative_local_path_prefix,
+                        list_result=future.result(),
+                    )
+                    for get_action in get_actions:
+                        yield get_action
+                    for directory_path_components, new_relative_local_path_prefix in subdirectories:
+                        pending[executor.submit(self.list_remote_file_or_directory, directory_path_components)] = (
+                            directory_path_components,
+                            new_relative_local_path_prefix,
+                        )
 
     # These methods operate on paths instead of sanitized path components
     def ls(
@@ -784,24 +1726,39 @@ class SimpleDAVClient(object):
             local_path (str): Local file or directory to upload.
         """
         remote_path_components = remote_path_to_remote_path_components(remote_path=remote_directory_path)
+
+        # Group actions by their exact type with a dict lookup instead of isinstance() chains
+        create_remote_directories = []  # type: List[CreateRemoteDirectory]
+        upload_local_files = []  # type: List[UploadLocalFile]
+        put_action_types_to_put_actions = {
+            CreateRemoteDirectory: create_remote_directories,
+            UploadLocalFile: upload_local_files,
+        }  # type: Dict[type, List[PutAction]]
         for put_action in iterate_put_actions(local_path=local_path):
-            if isinstance(put_action, CreateRemoteDirectory):
-                self.create_directory_from_remote_path_components(
-                    remote_path_components=remote_path_components.extend(
-                        put_action.relative_remote_directory_path_components,
-                    )
+            put_action_types_to_put_actions[type(put_action)].append(put_action)
+
+        # Create directories sequentially, as parents must exist before their children
+        for create_remote_directory in create_remote_directories:
+            self.create_directory_from_remote_path_components(
+                remote_path_components=(
+                        remote_path_components
+                        + tuple(create_remote_directory.relative_remote_directory_path_components)
                 )
-            elif isinstance(put_action, UploadLocalFile):
-                local_file_path = put_action.local_file_path
-                remote_file_path_components = remote_path_components.extend(
-                    put_action.relative_remote_file_path_components,
-                )
-                with open(local_file_path, 'rb') as f:
-                    self.put_file_to_remote_path_components(
-                        binary_file=f,
-                        remote_path_components=remote_file_path_components,
-                    )
-                    print('%s -> %s' % (local_file_path, '/'.join(remote_file_path_components)))
+            )
+
+        # Upload files concurrently, as every PUT is independent once the directories exist
+        local_file_paths = [upload_local_file.local_file_path for upload_local_file in upload_local_files]
+        remote_file_paths_components = [
+            remote_path_components + tuple(upload_local_file.relative_remote_file_path_components)
+            for upload_local_file in upload_local_files
+        ]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(self.upload_local_file, local_file_path, remote_file_path_components)
+                for local_file_path, remote_file_path_components in zip(local_file_paths, remote_file_paths_components)
+            ]
+            for index in iterate_indices_of_completed_futures(futures=futures):
+                print('%s -> %s' % (local_file_paths[index], '/'.join(remote_file_paths_components[index])))
 
     def get(
             self,
@@ -816,23 +1773,67 @@ class SimpleDAVClient(object):
             remote_path (str): File or directory to download from the server.
         """
         remote_path_components = remote_path_to_remote_path_components(remote_path=remote_path)
+
+        # Group actions by their exact type with a dict lookup instead of isinstance() chains
+        create_local_directories = []  # type: List[CreateLocalDirectory]
+        download_remote_files = []  # type: List[DownloadRemoteFile]
+        get_action_types_to_get_actions = {
+            CreateLocalDirectory: create_local_directories,
+            DownloadRemoteFile: download_remote_files,
+        }  # type: Dict[type, List[GetAction]]
         for get_action in self.iterate_get_actions(remote_path_components=remote_path_components):
-            if isinstance(get_action, CreateLocalDirectory):
-                local_directory_to_create_path = os.path.join(
-                    local_directory_path,
-                    *get_action.relative_local_directory_path_components
-                )
+            get_action_types_to_get_actions[type(get_action)].append(get_action)
+
+        # Join each distinct directory path once, so that every file path below is a single join onto its parent
+        relative_path_components_to_local_directory_paths = {
+            (): local_directory_path,
+        }  # type: Dict[Tuple[str, ...], str]
+        for create_local_directory in create_local_directories:
+            relative_local_directory_path_components = create_local_directory.relative_local_directory_path_components
+            if relative_local_directory_path_components not in relative_path_components_to_local_directory_paths:
+                relative_path_components_to_local_directory_paths[
+                    relative_local_directory_path_components
+                ] = os.path.join(local_directory_path, *relative_local_directory_path_components)
+
+        # Create each distinct directory once, shortest paths (parents) first
+        local_directories_to_create_paths = sorted(
+            (
+                local_directory_to_create_path
+                for relative_local_directory_path_components, local_directory_to_create_path
+                in relative_path_components_to_local_directory_paths.items()
+                if relative_local_directory_path_components
+            ),
+            key=len,
+        )
+        for local_directory_to_create_path in local_directories_to_create_paths:
+            # Equivalent to os.makedirs(..., exist_ok=True), which Python 2 lacks
+            try:
+                os.makedirs(local_directory_to_create_path)
+            except OSError:
                 if not os.path.isdir(local_directory_to_create_path):
-                    os.mkdir(local_directory_to_create_path)
-            elif isinstance(get_action, DownloadRemoteFile):
-                remote_file_path_components = get_action.remote_file_path_components
-                local_file_path = os.path.join(local_directory_path, *get_action.relative_local_file_path_components)
-                with open(local_file_path, 'wb') as f:
-                    for chunk in self.get_file_from_remote_path_components(
-                            remote_path_components=remote_file_path_components
-                    ):
-                        f.write(chunk)
-                    print('%s -> %s' % ('/'.join(remote_file_path_components), local_file_path))
+                    raise
+
+        # Download files concurrently, as every GET is independent once the directories exist
+        remote_file_paths_components = [
+            download_remote_file.remote_file_path_components
+            for download_remote_file in download_remote_files
+        ]
+        local_file_paths = [
+            os.path.join(
+                relative_path_components_to_local_directory_paths[
+                    download_remote_file.relative_local_file_path_components[:-1]
+                ],
+                download_remote_file.relative_local_file_path_components[-1],
+            )
+            for download_remote_file in download_remote_files
+        ]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(self.download_remote_file, remote_file_path_components, local_file_path)
+                for remote_file_path_components, local_file_path in zip(remote_file_paths_components, local_file_paths)
+            ]
+            for index in iterate_indices_of_completed_futures(futures=futures):
+                print('%s -> %s' % ('/'.join(remote_file_paths_components[index]), local_file_paths[index]))
 
     def rm(
             self,
@@ -844,28 +1845,117 @@ class SimpleDAVClient(object):
         Args:
             remote_path (str): Path of the remote file or directory to remove.
         """
-        remote_path_components = remote_path_to_remote_path_components(remote_path=remote_path)
-        if self.delete_file_or_directory_from_remote_path_components(remote_path_components=remote_path_components):
-            print('removed %s' % (remote_path,))
+        self.rm_all(remote_paths=[remote_path])
+
+    def rm_all(
+            self,
+            remote_paths,  # type: Sequence[str]
+    ):
+        """
+        Remove remote files or directories, reporting the outcomes in the given order. Used for the 'rm' command.
+        The DELETEs are issued concurrently unless a path is the same as, or nested within, another,
+        as the outcomes would then depend on which DELETE the server handles first.
+
+        Args:
+            remote_paths (Sequence[str]): Paths of the remote files or directories to remove.
+        """
+        remote_paths_components = [
+            remote_path_to_remote_path_components(remote_path=remote_path)
+            for remote_path in remote_paths
+        ]
+        if have_nested_remote_paths(remote_paths_components=remote_paths_components):
+            # A single worker issues the DELETEs one after another, in the given order
+            max_workers = 1
         else:
-            print('cannot remove %s' % (remote_path,), file=sys.stderr)
+            max_workers = self.max_workers
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for remote_path, removed in zip(
+                    remote_paths,
+                    executor.map(self.delete_file_or_directory_from_remote_path_components, remote_paths_components),
+            ):
+                if removed:
+                    print('removed %s' % (remote_path,))
+                else:
+                    print('cannot remove %s' % (remote_path,), file=sys.stderr)
 
 
-def main():
+def run_ls(
+        client,  # type: SimpleDAVClient
+        args,  # type: argparse.Namespace
+):
+    """Run the 'ls' command."""
+    client.ls(remote_path=args.remote_path or '/')
+
+
+def run_mkdir(
+        client,  # type: SimpleDAVClient
+        args,  # type: argparse.Namespace
+):
+    """Run the 'mkdir' command."""
+    client.mkdir(remote_directory_path=args.remote_directory_path, p=args.p)
+
+
+def run_put(
+        client,  # type: SimpleDAVClient
+        args,  # type: argparse.Namespace
+):
+    """
+    Run the 'put' command.
+    The local paths are uploaded one after another, as they may map to the same remote paths,
+    while each upload already runs its PUTs concurrently.
+    """
+    for local_path in args.local_paths:
+        client.put(remote_directory_path=args.remote_directory_path, local_path=local_path)
+
+
+def run_get(
+        client,  # type: SimpleDAVClient
+        args,  # type: argparse.Namespace
+):
+    """
+    Run the 'get' command.
+    The remote paths are downloaded one after another, as they may map to the same local paths,
+    while each download already runs its GETs concurrently.
+    """
+    for remote_path in args.remote_paths:
+        client.get(local_directory_path=args.local_directory_path, remote_path=remote_path)
+
+
+def run_rm(
+        client,  # type: SimpleDAVClient
+        args,  # type: argparse.Namespace
+):
+    """Run the 'rm' command."""
+    client.rm_all(remote_paths=args.remote_paths)
+
+
+def build_parser():
+    # type: () -> Tuple[argparse.ArgumentParser, Sequence[str]]
+    """
+    Build the command-line parser.
+    Each subcommand's parser sets `run_command` to the function running it.
+
+    Returns:
+        Tuple[argparse.ArgumentParser, Sequence[str]]: The command-line parser and the names of its subcommands.
+    """
     # Top-level parser
     parser = argparse.ArgumentParser(description='Simple DAV Client')
     parser.add_argument('--host', type=str, default='localhost', help='WebDAV server hostname (default: localhost)')
     parser.add_argument('--port', type=int, default=8080, help='WebDAV server port (default: 8080)')
+    parser.set_defaults(run_command=None)
     subparsers = parser.add_subparsers(dest='command')
 
     # ls command
     ls_parser = subparsers.add_parser('ls', help='List remote file or directory')
     ls_parser.add_argument('remote_path', type=str, nargs='?', help='Remote file or directory')
+    ls_parser.set_defaults(run_command=run_ls)
 
     # mkdir command
     mkdir_parser = subparsers.add_parser('mkdir', help='Create remote directory')
     mkdir_parser.add_argument('remote_directory_path', type=str, help='Remote directory')
     mkdir_parser.add_argument('-p', action='store_true', help='Make parent directories as needed')
+    mkdir_parser.set_defaults(run_command=run_mkdir)
 
     # put command
     put_parser = subparsers.add_parser('put', help='Upload remote file or directory to remote directory')
@@ -883,6 +1973,7 @@ def main():
         nargs='+',
         help='Local file or directory (one or more) to upload'
     )
+    put_parser.set_defaults(run_command=run_put)
 
     # get command
     get_parser = subparsers.add_parser('get', help='Download remote file or directory to local directory')
@@ -900,6 +1991,7 @@ def main():
         nargs='+',
         help='Remote file or directory (one or more) to download'
     )
+    get_parser.set_defaults(run_command=run_get)
 
     # rm command
     rm_parser = subparsers.add_parser('rm', help='Remove remote file or directory')
@@ -910,28 +2002,25 @@ def main():
         nargs='+',
         help='Remote file or directory (one or more) to remove'
     )
+    rm_parser.set_defaults(run_command=run_rm)
+
+    return parser, list(subparsers.choices.keys())
 
+
+def main():
+    parser, subcommands = build_parser()
     args = parser.parse_args()
+    if args.run_command is None:
+        parser.error('argument subcommand: not provided (choose from %s)' % (', '.join(subcommands),))
 
     # Create client
     client = SimpleDAVClient(host=args.host, port=args.port)
 
-    # Dispatch commands
-    if args.command == 'ls':
-        client.ls(remote_path=args.remote_path or '/')
-    elif args.command == 'mkdir':
-        client.mkdir(remote_directory_path=args.remote_directory_path, p=args.p)
-    elif args.command == 'put':
-        for local_path in args.local_paths:
-            client.put(remote_directory_path=args.remote_directory_path, local_path=local_path)
-    elif args.command == 'get':
-        for remote_path in args.remote_paths:
-            client.get(local_directory_path=args.local_directory_path, remote_path=remote_path)
-    elif args.command == 'rm':
-        for remote_path in args.remote_paths:
-            client.rm(remote_path=remote_path)
-    else:
-        parser.error('argument subcommand: not provided (choose from %s)' % (', '.join(subparsers.choices.keys()),))
+    # Dispatch command
+    try:
+        args.run_command(client, args)
+    finally:
+        client.close()
 
 
 if __name__ == '__main__':